@@ -178,7 +178,9 @@ class LandsatImage(tiff.TiffImage):
                 all_files_present = _check_if_files_present(mtl_data, untar_folder)
 
         if all_files_present:
-            print('Already have unpacked files in ' + untar_folder)
+            # this runs every time the image is opened, e.g., for each epoch of training
+            if config.general.verbose():
+                print('Already have unpacked files in ' + untar_folder)
         else:
             print('Unpacking tar file ' + paths + ' to folder ' + untar_folder)
             utilities.unpack_to_folder(paths, untar_folder)
@@ -213,36 +215,46 @@ class LandsatImage(tiff.TiffImage):
     def sun_elevation(self):
         return self._mtl_data['SUN_ELEVATION']
 
+def _fill_nodata(buf, data):
+    """Set buf to OUTPUT_NODATA wherever data is not positive. Most bands have no
+       nodata at all, so skip the masked write entirely in that case."""
+    invalid = np.logical_not(data > 0)
+    if invalid.any():
+        buf[invalid] = OUTPUT_NODATA
+
 # top of atmosphere correction
+# The outputs are filled one band at a time, so they are allocated band planar
+# (like the buffers images are read into) and returned as a (rows, columns, bands) view.
 def _apply_toa_radiance(data, _, bands, factors, constants):
     """Apply a top of atmosphere radiance conversion to landsat data"""
-    buf = np.zeros(data.shape, dtype=np.float32)
+    buf = np.zeros((data.shape[2], data.shape[0], data.shape[1]), dtype=np.float32)
     for b in bands:
         f = factors[b]
         c = constants[b]
-        buf[:, :, b] = np.where(data[:, :, b] > 0, data[:, :, b] * f + c, OUTPUT_NODATA)
-    return buf
+        buf[b] = data[:, :, b] * f + c
+        _fill_nodata(buf[b], data[:, :, b])
+    return np.transpose(buf, (1, 2, 0))
 
 def _apply_toa_temperature(data, _, bands, factors, constants, k1, k2):
     """Apply a top of atmosphere radiance + temp conversion to landsat data"""
-    buf = np.zeros(data.shape, dtype=np.float32)
+    buf = np.zeros((data.shape[2], data.shape[0], data.shape[1]), dtype=np.float32)
     for b in bands:
         f = factors[b]
         c = constants[b]
-        k1 = k1[b]
-        k2 = k2[b]
-        buf[:, :, b] = np.where(data[:, :, b] > 0, k2 / np.log(k1 / (data[:, :, b] * f + c) + 1.0), OUTPUT_NODATA)
-    return buf
+        buf[b] = k2[b] / np.log(k1[b] / (data[:, :, b] * f + c) + 1.0)
+        _fill_nodata(buf[b], data[:, :, b])
+    return np.transpose(buf, (1, 2, 0))
 
 def _apply_toa_reflectance(data, _, bands, factors, constants, sun_elevation):
     """Apply a top of atmosphere radiance + temp conversion to landsat data"""
-    buf = np.zeros(data.shape, dtype=np.float32)
+    buf = np.zeros((data.shape[2], data.shape[0], data.shape[1]), dtype=np.float32)
     for b in bands:
         f = factors[b]
         c = constants[b]
         se = sun_elevation[b]
-        buf[:, :, b] = np.where(data[:, :, b] > 0, (data[:, :, b] * f + c) / math.sin(se), OUTPUT_NODATA)
-    return buf
+        buf[b] = (data[:, :, b] * f + c) / math.sin(se)
+        _fill_nodata(buf[b], data[:, :, b])
+    return np.transpose(buf, (1, 2, 0))
 
 def toa_preprocess(image, calc_reflectance=False):
     """Convert landsat files in one folder to TOA corrected files in the output folder.
@@ -20,7 +20,9 @@ Functions to support Sentinel1 satellites.
 """
 
 import os
+import shutil
 import portalocker
+from osgeo import gdal
 
 from delta.config import config
 from delta.imagery import utilities
@@ -79,7 +81,8 @@ def unpack_s1_to_folder(zip_path, unpack_folder):
             test_image = None
 
         if test_image: # Merged image is ready to use
-            print('Already have unpacked files in ' + unpack_folder)
+            if config.general.verbose():
+                print('Already have unpacked files in ' + unpack_folder)
             return merged_path
         # Otherwise go through the entire unpack process
 
@@ -92,7 +95,7 @@ def unpack_s1_to_folder(zip_path, unpack_folder):
                 print('Already have files')
             else:
                 print('Clearing unpack folder missing image files.')
-                os.system('rm -rf ' + unpack_folder)
+                shutil.rmtree(unpack_folder)
 
         if need_to_unpack:
             print('Unpacking file ' + zip_path + ' to folder ' + unpack_folder)
@@ -100,9 +103,10 @@ def unpack_s1_to_folder(zip_path, unpack_folder):
             subdirs = os.listdir(unpack_folder)
             if len(subdirs) != 1:
                 raise Exception('Unexpected Sentinel1 subdirectories: ' + str(subdirs))
-            cmd = 'mv ' + os.path.join(unpack_folder, subdirs[0]) +'/* ' + unpack_folder
-            print(cmd)
-            os.system(cmd)
+            subdir = os.path.join(unpack_folder, subdirs[0])
+            for filename in os.listdir(subdir):
+                os.rename(os.path.join(subdir, filename), os.path.join(unpack_folder, filename))
+            os.rmdir(subdir)
         source_image_paths = get_files_from_unpack_folder(unpack_folder)
 
         if len(source_image_paths) != NUM_SOURCE_CHANNELS:
@@ -125,14 +129,14 @@ def unpack_s1_to_folder(zip_path, unpack_folder):
                                 +'Do you have SNAP installed in the default location?')
             if os.path.getsize(temp_out_path) < MIN_IMAGE_SIZE:
                 raise Exception('SNAP encountered a problem processing the file!')
-            os.system('mv ' + temp_out_path + ' ' + merged_path)
+            os.rename(temp_out_path, merged_path)
         else:
             # Generate a merged file containing all input images as an N channel image
-            cmd = 'gdalbuildvrt -separate ' + merged_path
-            for f in source_image_paths:
-                cmd += ' ' + f
-            print(cmd)
-            os.system(cmd)
+            vrt = gdal.BuildVRT(merged_path, source_image_paths, separate=True)
+            if vrt is None:
+                raise Exception('Failed to build merged Sentinel1 file: ' + merged_path)
+            vrt.FlushCache()
+            vrt = None # closes the file
 
         # Verify that we generated a valid image file
         try:
@@ -18,8 +18,11 @@
 """
 Block-aligned reading from multiple Geotiff files.
 """
+import concurrent.futures
+import contextlib
+import inspect
 import os
-import math
+import threading
 
 import numpy as np
 from osgeo import gdal
@@ -40,10 +43,35 @@ _GDAL_TO_NUMPY_TYPES = {
 }
 _NUMPY_TO_GDAL_TYPES = {v: k for k, v in _GDAL_TO_NUMPY_TYPES.items()}
 
+# Dataset.ReadAsArray only takes band_list from gdal 3.5, otherwise bands are read one at a time
+_READ_BAND_LIST = 'band_list' in inspect.signature(gdal.Dataset.ReadAsArray).parameters
+
+# thread pool shared by all images for reading strips in parallel
+_read_pool = None
+_read_pool_size = 0
+_read_pool_lock = threading.Lock()
+
+def _get_read_pool(num_threads):
+    """Returns the shared read thread pool, with at least num_threads workers."""
+    global _read_pool, _read_pool_size #pylint: disable=global-statement
+    with _read_pool_lock:
+        if _read_pool is None or _read_pool_size < num_threads:
+            # not shut down, other threads may still submit to it; its workers exit once it is released
+            _read_pool = concurrent.futures.ThreadPoolExecutor(num_threads)
+            _read_pool_size = num_threads
+        return _read_pool
+
+def _open_handle(path):
+    """Opens path with gdal, raising an exception on failure."""
+    handle = gdal.Open(path)
+    if handle is None:
+        raise Exception('Failed to open tiff file %s.' % (path))
+    return handle
+
 class TiffImage(delta_image.DeltaImage):
     """Images supported by GDAL."""
 
-    def __init__(self, path, nodata_value=None):
+    def __init__(self, path, nodata_value=None, num_threads=None):
         """
         Opens a geotiff for reading.
 
@@ -54,26 +82,50 @@ class TiffImage(delta_image.DeltaImage):
             For a list, the images are opened in order as a multi-band image, assumed to overlap.
         nodata_value: dtype of image
             Value representing no data.
+        num_threads: int
+            Number of threads to read (and decompress) with. Up to this many handles are
+            opened to each file, since gdal datasets cannot be shared between threads.
+            Defaults to the number of cpus, up to eight.
         """
         super().__init__(nodata_value)
         paths = self._prep(path)
 
         self._path = path
         self._paths = paths
-        self._handles = []
+        if num_threads is None:
+            num_threads = min(os.cpu_count() or 1, 8)
+        self._num_threads = num_threads
+        self._dtype = None
+        handles = []
         for p in paths:
             if not os.path.exists(p):
                 raise Exception('Image file does not exist: ' + p)
-            result = gdal.Open(p)
-            if result is None:
-                raise Exception('Failed to open tiff file %s.' % (p))
-            self._handles.append(result)
+            handles.append(_open_handle(p))
+        # the header values are used often, so read them once
+        self._size = (handles[0].RasterYSize, handles[0].RasterXSize)
+        band = handles[0].GetRasterBand(1)
+        block_size = band.GetBlockSize()
+        self._block_size = (block_size[1], block_size[0])
+        self._first_type = band.DataType
+        self._pixel_interleaved = [h.GetMetadataItem('INTERLEAVE', 'IMAGE_STRUCTURE') == 'PIXEL' for h in handles]
         self._band_map = []
-        for i, h in enumerate(self._handles):
-            if h.RasterXSize != self._handles[0].RasterXSize or h.RasterYSize != self._handles[0].RasterYSize:
+        for i, h in enumerate(handles):
+            if (h.RasterYSize, h.RasterXSize) != self._size:
                 raise Exception('Images %s and %s have different sizes!' % (self._paths[0], self._paths[i]))
             for j in range(h.RasterCount):
                 self._band_map.append((i, j + 1)) # gdal uses 1-based band indexing
+        # idle gdal handles for each file, each in use by at most one thread at a time.
+        # These are opened now so the image stays readable if the files are later removed
+        # (e.g., evicted from the disk cache).
+        # More are opened on demand, up to num_threads for the whole image (but at least
+        # one per file), so the handles don't grow with both the threads and the files.
+        self._idle_handles = [[h] for h in handles]
+        self._num_handles = [1] * len(paths)
+        self._max_handles = [max(1, self._num_threads)] * len(paths)
+        self._max_total_handles = max(self._num_threads, len(paths))
+        # one condition per file, so a returned handle wakes a thread waiting for that file
+        self._handles_lock = threading.Lock()
+        self._handles_cond = [threading.Condition(self._handles_lock) for _ in paths]
 
     def __del__(self):
         self.close()
@@ -99,16 +151,60 @@ class TiffImage(delta_image.DeltaImage):
         return paths
 
     def __asert_open(self):
-        if self._handles is None:
+        if self._paths is None:
             raise IOError('Operating on an image that has been closed.')
 
+    @contextlib.contextmanager
+    def _gdal_handle(self, index):
+        """
+        Checks out a gdal handle for file index, for the duration of a with block.
+
+        gdal datasets are not thread safe, so a handle is used by one thread at a time.
+        Handles are opened as needed up to num_threads for the whole image, after which
+        callers wait for one to be returned.
+        """
+        with self._handles_lock:
+            while not self._idle_handles[index] and \
+                  (self._num_handles[index] >= self._max_handles[index] or
+                   sum(self._num_handles) >= self._max_total_handles):
+                self._handles_cond[index].wait()
+            if self._idle_handles[index]:
+                handle = self._idle_handles[index].pop()
+            else:
+                handle = None
+                self._num_handles[index] += 1
+        if handle is None:
+            try:
+                handle = _open_handle(self._paths[index])
+            except Exception:
+                with self._handles_lock:
+                    self._num_handles[index] -= 1
+                    if self._num_handles[index] == 0:
+                        self._handles_cond[index].notify()
+                        raise
+                    # the file may have been removed since the image was opened,
+                    # so share the handles that are already open
+                    self._max_handles[index] = self._num_handles[index]
+                    while not self._idle_handles[index]:
+                        self._handles_cond[index].wait()
+                    handle = self._idle_handles[index].pop()
+        try:
+            yield handle
+        finally:
+            with self._handles_lock:
+                self._idle_handles[index].append(handle)
+                self._handles_cond[index].notify()
+
     def close(self):
         """
         Close the image.
         """
-        self._handles = None # gdal doesn't have a close function for some reason
+        self._idle_handles = None # gdal doesn't have a close function for some reason
         self._band_map = None
         self._paths = None
+        self._size = None
+        self._block_size = None
+        self._dtype = None
 
     def path(self):
         """
@@ -122,7 +218,7 @@ class TiffImage(delta_image.DeltaImage):
 
     def size(self):
         self.__asert_open()
-        return (self._handles[0].RasterYSize, self._handles[0].RasterXSize)
+        return self._size
 
     def _read(self, roi, bands, buf=None):
         self.__asert_open()
@@ -130,34 +226,100 @@ class TiffImage(delta_image.DeltaImage):
 
         if buf is None:
             buf = np.zeros(shape=(num_bands, roi.width(), roi.height()), dtype=self.dtype())
-        for i, b in enumerate(bands):
-            band_handle = self._gdal_band(b)
+        for i in range(len(bands)):
             s = buf[i, :, :].shape
             if s != (roi.width(), roi.height()):
                 raise IOError('Buffer shape should be (%d, %d) but is (%d, %d)!' %
                               (roi.width(), roi.height(), s[0], s[1]))
-            band_handle.ReadAsArray(roi.min_y, roi.min_x, roi.height(), roi.width(), buf_obj=buf[i, :, :])
+
+        # consecutive bands from the same pixel interleaved file are read with a single call
+        runs = self._band_runs(bands)
+        strips = self._read_strips(roi, len(runs))
+        if self._num_threads <= 1 or len(runs) * len(strips) <= 1:
+            for (h, band_list, start, stop) in runs:
+                with self._gdal_handle(h) as handle:
+                    self._read_run(handle, band_list, roi, buf[start:stop, :, :])
+        else:
+            pool = _get_read_pool(self._num_threads)
+            jobs = []
+            for (h, band_list, start, stop) in runs:
+                for strip in strips:
+                    jobs.append(pool.submit(self._read_strip, strip, h, band_list,
+                                                  buf[start:stop, strip.min_x - roi.min_x:strip.max_x - roi.min_x, :]))
+            for j in jobs:
+                j.result()
         return np.transpose(buf, [1, 2, 0])
 
-    def _gdal_band(self, band):
-        (h, b) = self._band_map[band]
-        ret = self._handles[h].GetRasterBand(b)
-        assert ret
-        return ret
+    def _band_runs(self, bands):
+        """
+        Group the requested bands into runs of consecutive bands in the same file.
+        Only pixel interleaved files are grouped, since for these reading the bands
+        separately decompresses every block once per band, and only if gdal can read
+        a list of bands into a buffer.
+
+        Returns
+        -------
+        List[(int, List[int], int, int)]:
+            File index, gdal band numbers, and the start and end of the run in bands.
+        """
+        runs = []
+        for (i, b) in enumerate(bands):
+            (h, gb) = self._band_map[b]
+            if runs and runs[-1][0] == h and runs[-1][1][-1] + 1 == gb and \
+               _READ_BAND_LIST and self._pixel_interleaved[h]:
+                runs[-1][1].append(gb)
+                runs[-1][3] = i + 1
+            else:
+                runs.append([h, [gb], i, i + 1])
+        return runs
+
+    def _read_strips(self, roi, num_bands):
+        """
+        Split roi into row strips to read in parallel, aligned with the block grid so
+        that no block is decompressed by more than one thread.
+        """
+        num_strips = max(1, -(-self._num_threads // max(1, num_bands)))
+        block_rows = self.block_size()[0]
+        rows = max(1, -(-roi.width() // num_strips))
+        rows = -(-rows // block_rows) * block_rows
+        edges = [roi.min_x] + list(range((roi.min_x // rows + 1) * rows, roi.max_x, rows)) + [roi.max_x]
+        return [rectangle.Rectangle(edges[i], roi.min_y, edges[i + 1], roi.max_y) for i in range(len(edges) - 1)]
+
+    @staticmethod
+    def _read_run(handle, band_list, roi, buf):
+        """Read the bands in band_list from one gdal dataset into buf, shaped (bands, rows, columns)."""
+        if len(band_list) == 1:
+            ret = handle.GetRasterBand(band_list[0])
+            assert ret
+            ret.ReadAsArray(roi.min_y, roi.min_x, roi.height(), roi.width(), buf_obj=buf[0, :, :])
+            return
+        # one dataset level read, so pixel interleaved blocks are only decompressed once
+        handle.ReadAsArray(roi.min_y, roi.min_x, roi.height(), roi.width(), buf_obj=buf, band_list=band_list)
+
+    def _read_strip(self, roi, file_index, band_list, buf):
+        """Read a run of bands of roi into buf, from a worker thread."""
+        with self._gdal_handle(file_index) as handle:
+            self._read_run(handle, band_list, roi, buf)
 
     def _gdal_type(self, band=0):
         """
         Returns the GDAL data type of the image.
         """
         self.__asert_open()
-        return self._gdal_band(band).DataType
+        if band == 0:
+            return self._first_type
+        (h, b) = self._band_map[band]
+        with self._gdal_handle(h) as handle:
+            return handle.GetRasterBand(b).DataType
 
     def dtype(self):
         self.__asert_open()
-        dtype = self._gdal_type(0)
-        if dtype in _GDAL_TO_NUMPY_TYPES:
-            return _GDAL_TO_NUMPY_TYPES[dtype]
-        raise Exception('Unrecognized gdal data type: ' + str(dtype))
+        if self._dtype is None:
+            dtype = self._gdal_type(0)
+            if dtype not in _GDAL_TO_NUMPY_TYPES:
+                raise Exception('Unrecognized gdal data type: ' + str(dtype))
+            self._dtype = _GDAL_TO_NUMPY_TYPES[dtype]
+        return self._dtype
 
     def bytes_per_pixel(self, band=0):
         """
@@ -177,19 +339,17 @@ class TiffImage(delta_image.DeltaImage):
             block height, block width
         """
         self.__asert_open()
-        band_handle = self._gdal_band(0)
-        block_size = band_handle.GetBlockSize()
-        return (block_size[1], block_size[0])
+        return self._block_size
 
     def metadata(self):
         self.__asert_open()
         data = dict()
-        h = self._handles[0]
-        data['projection'] = h.GetProjection()
-        data['geotransform'] = h.GetGeoTransform()
-        data['gcps'] = h.GetGCPs()
-        data['gcpproj'] = h.GetGCPProjection()
-        data['metadata'] = h.GetMetadata()
+        with self._gdal_handle(0) as h:
+            data['projection'] = h.GetProjection()
+            data['geotransform'] = h.GetGeoTransform()
+            data['gcps'] = h.GetGCPs()
+            data['gcpproj'] = h.GetGCPProjection()
+            data['metadata'] = h.GetMetadata()
         return data
 
     def block_aligned_roi(self, desired_roi):
@@ -200,12 +360,12 @@ class TiffImage(delta_image.DeltaImage):
                             + ' is outside the bounds of image with size' + str(self.size()))
 
         block_size = self.block_size()
-        start_block_x = int(math.floor(desired_roi.min_x     / block_size[0]))
-        start_block_y = int(math.floor(desired_roi.min_y     / block_size[1]))
+        start_block_x = desired_roi.min_x     // block_size[0]
+        start_block_y = desired_roi.min_y     // block_size[1]
         # Rect max is exclusive
-        stop_block_x = int(math.floor((desired_roi.max_x-1) / block_size[0]))
+        stop_block_x = (desired_roi.max_x-1) // block_size[0]
         # The stops are inclusive
-        stop_block_y = int(math.floor((desired_roi.max_y-1) / block_size[1]))
+        stop_block_y = (desired_roi.max_y-1) // block_size[1]
 
         start_x = start_block_x * block_size[0]
         start_y = start_block_y * block_size[1]
@@ -309,6 +469,7 @@ class _TiffWriter:
                  tile_width=256, tile_height=256, nodata_value=None, metadata=None):
         self._width  = width
         self._height = height
+        assert tile_width > 0 and tile_height > 0, 'Tile size must be positive.'
         self._tile_height = tile_height
         self._tile_width  = tile_width
         self._handle = None
@@ -352,8 +513,8 @@ class _TiffWriter:
             self._handle = None
 
     def get_num_tiles(self):
-        num_x = int(math.ceil(self._width  / self._tile_width))
-        num_y = int(math.ceil(self._height / self._tile_height))
+        num_x = -(-self._width  // self._tile_width)
+        num_y = -(-self._height // self._tile_height)
         return (num_x, num_y)
 
     def write_block(self, data, block_x, block_y, band=0):
@@ -215,12 +215,13 @@ class WorldviewImage(tiff.TiffImage):
 
 def _apply_toa_radiance(data, _, bands, factors, widths):
     """Apply a top of atmosphere radiance conversion to WorldView data"""
-    buf = np.zeros(data.shape, dtype=np.float32)
+    # filled one band at a time, so allocate band planar and return a (rows, columns, bands) view
+    buf = np.zeros((data.shape[2], data.shape[0], data.shape[1]), dtype=np.float32)
     for b in bands:
         f = factors[b]
         w = widths[b]
-        buf[:, :, b] = np.where(data[:, :, b] > 0, (data[:, :, b] * f) / w, OUTPUT_NODATA)
-    return buf
+        buf[b] = np.where(data[:, :, b] > 0, (data[:, :, b] * f) / w, OUTPUT_NODATA)
+    return np.transpose(buf, (1, 2, 0))
 
 #def _apply_toa_reflectance(data, band, factor, width, sun_elevation,
 #                           satellite, earth_sun_distance):
@@ -194,6 +194,33 @@ class DeltaImage(ABC):
         """
         return (256, 256)
 
+    def choose_num_regions(self, budget_bytes: int, roi: rectangle.Rectangle=None,
+                           bytes_per_pixel: int=None) -> int:
+        """
+        Parameters
+        ----------
+        budget_bytes: int
+            Memory available to process one region of the image.
+        roi: delta.imagery.rectangle.Rectangle
+            Part of the image to split. Defaults to the whole image.
+        bytes_per_pixel: int
+            Memory needed for each pixel of a region. Defaults to the size of
+            a pixel as read, with all bands.
+
+        Returns
+        -------
+        int:
+            The minimum number of regions to split roi into so that
+            a single region fits in `budget_bytes`.
+        """
+        assert budget_bytes > 0, 'Memory budget must be positive.'
+        if roi is None:
+            roi = rectangle.Rectangle(0, 0, width=self.width(), height=self.height())
+        if bytes_per_pixel is None:
+            bytes_per_pixel = self.num_bands() * np.dtype(self.dtype()).itemsize
+        total_bytes = roi.area() * bytes_per_pixel
+        return max(1, -(-total_bytes // budget_bytes))
+
     def width(self) -> int:
         """
         Returns
@@ -233,6 +260,7 @@ class DeltaImage(ABC):
         by_block: bool
             If true, changes the returned generator to group tiles by block.
             This is intended to optimize disk reads by reading the entire block at once.
+            Blocks are aligned to the rows of `block_size`.
 
         Returns
         -------
@@ -243,7 +271,7 @@ class DeltaImage(ABC):
         input_bounds = rectangle.Rectangle(0, 0, max_x=self.width(), max_y=self.height())
         return input_bounds.make_tile_rois(shape, overlap_shape=overlap_shape, include_partials=partials,
                                            min_shape=min_shape, partials_overlap=partials_overlap,
-                                           by_block=by_block)
+                                           by_block=by_block, block_shape=self.block_size() if by_block else None)
 
     def roi_generator(self, requested_rois: Iterator[rectangle.Rectangle]) -> \
                   Iterator[Tuple[rectangle.Rectangle, np.ndarray, int, int]]:
@@ -54,6 +54,7 @@ class ImageSet:
         self._image_type = image_type
         self._preprocess = preprocess
         self._nodata_value = nodata_value
+        self._num_bands = None
 
     def type(self):
         """
@@ -110,6 +111,18 @@ class ImageSet:
             img.set_preprocess(self._preprocess)
         return img
 
+    def num_bands(self):
+        """
+        Returns
+        -------
+        int:
+            The number of bands in the images. Read from the first image the first time
+            it is called, all images in the set are assumed to have the same number of bands.
+        """
+        if self._num_bands is None:
+            self._num_bands = self.load(0).num_bands()
+        return self._num_bands
+
     def __len__(self):
         return len(self._images)
     def __getitem__(self, index):
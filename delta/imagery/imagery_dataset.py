@@ -57,7 +57,9 @@ class ImageryDataset: # pylint: disable=too-many-instance-attributes
 
         self._resume_mode = False
         self._log_folder  = None
-        self._iopool = ThreadPoolExecutor(1)
+        # reads are shared between all the interleaved images. gdal releases the GIL while
+        # reading and decompressing, so these threads run in parallel.
+        self._iopool = ThreadPoolExecutor(max(1, config.io.threads()))
 
         # Record some of the config values
         self.set_chunk_output_shapes(chunk_shape, output_shape)
@@ -79,8 +81,7 @@ class ImageryDataset: # pylint: disable=too-many-instance-attributes
         self._labels = labels
         self._access_counts = [np.zeros(0, np.uint8), np.zeros(0, np.uint8)]
 
-        # Load the first image to get the number of bands for the input files.
-        self._num_bands = images.load(0).num_bands()
+        self._num_bands = images.num_bands()
 
     # TODO: I am skeptical that this works with multiple epochs.
     # It is also less important now that training is so much faster.
@@ -276,13 +277,12 @@ class ImageryDataset: # pylint: disable=too-many-instance-attributes
         # read one row ahead of what we process now
         next_buf = self._iopool.submit(lambda: image.read(tiles[0][0]))
         for (c, (rect, sub_tiles)) in enumerate(tiles):
-            cur_buf = next_buf
+            # wait for the current read before starting the next, so that the
+            # image is only ever read from one thread at a time
+            buf = next_buf.result()
             if c + 1 < len(tiles):
                 # extra lambda to bind c in closure
                 next_buf = self._iopool.submit((lambda x: (lambda: image.read(tiles[x + 1][0])))(c))
-            if cur_buf is None:
-                continue
-            buf = cur_buf.result()
             (rect, sub_tiles) = tiles[c]
             for s in sub_tiles:
                 if preprocess:
@@ -335,6 +335,12 @@ class ImageryDataset: # pylint: disable=too-many-instance-attributes
 
         return result
 
+    @staticmethod
+    def _filter_nodata_chunks(chunks, labels, nodata): # pragma: no cover
+        """Remove the chunks from a tile whose labels are entirely nodata."""
+        valid = tf.math.reduce_any(tf.math.not_equal(labels, nodata), axis=[1, 2])
+        return (tf.boolean_mask(chunks, valid), tf.boolean_mask(labels, valid))
+
     def _reshape_labels(self, labels): # pragma: no cover
         """Reshape the labels to account for the chunking process."""
         if self._chunk_shape:
@@ -356,31 +362,52 @@ class ImageryDataset: # pylint: disable=too-many-instance-attributes
         result = tf.reshape(labels, [-1, self._output_shape[0], self._output_shape[1]])
         return result
 
-    def data(self):
+    def _data_per_tile(self):
         """
         Returns
         -------
         Dataset:
-            image chunks / tiles.
+            image tiles, or if `chunk_shape` is set, a batch of chunks for each tile.
         """
         ret = self._load_images(False, self._data_type)
         if self._chunk_shape:
             ret = ret.map(self._chunk_image, num_parallel_calls=tf.data.experimental.AUTOTUNE)
-            return ret.unbatch()
         return ret
 
-    def labels(self):
+    def _labels_per_tile(self):
         """
         Returns
         -------
         Dataset:
-            Unbatched dataset of labels corresponding to `data()`.
+            label tiles, or if `chunk_shape` is set, a batch of label chunks for each tile.
         """
         label_set = self._load_images(True, self._label_type)
         if self._chunk_shape or self._output_shape:
             label_set = label_set.map(self._reshape_labels, num_parallel_calls=tf.data.experimental.AUTOTUNE) #pylint: disable=C0301
-            if self._chunk_shape:
-                return label_set.unbatch()
+        return label_set
+
+    def data(self):
+        """
+        Returns
+        -------
+        Dataset:
+            image chunks / tiles.
+        """
+        ret = self._data_per_tile()
+        if self._chunk_shape:
+            return ret.unbatch()
+        return ret
+
+    def labels(self):
+        """
+        Returns
+        -------
+        Dataset:
+            Unbatched dataset of labels corresponding to `data()`.
+        """
+        label_set = self._labels_per_tile()
+        if self._chunk_shape:
+            return label_set.unbatch()
         return label_set
 
     def dataset(self, class_weights=None):
@@ -398,11 +425,18 @@ class ImageryDataset: # pylint: disable=too-many-instance-attributes
             With (data, labels, optionally weights)
         """
 
-        # Pair the data and labels in our dataset
-        ds = tf.data.Dataset.zip((self.data(), self.labels()))
+        # Pair the data and labels in our dataset, one tile at a time
+        ds = tf.data.Dataset.zip((self._data_per_tile(), self._labels_per_tile()))
         # ignore chunks which are all nodata (nodata is re-indexed to be after the classes)
-        if self._labels.nodata_value() is not None:
-            ds = ds.filter(lambda x, y: tf.math.reduce_any(tf.math.not_equal(y, self._labels.nodata_value())))
+        nodata = self._labels.nodata_value()
+        if self._chunk_shape:
+            if nodata is not None:
+                # check all chunks of a tile with one reduction rather than filtering chunk by chunk
+                ds = ds.map(lambda x, y: self._filter_nodata_chunks(x, y, nodata),
+                            num_parallel_calls=tf.data.experimental.AUTOTUNE)
+            ds = ds.unbatch()
+        elif nodata is not None:
+            ds = ds.filter(lambda x, y: tf.math.reduce_any(tf.math.not_equal(y, nodata)))
         if class_weights is not None:
             class_weights.append(0.0)
             lookup = tf.constant(class_weights)
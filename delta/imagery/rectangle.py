@@ -18,7 +18,28 @@
 """
 Simple rectangle class, useful for dealing with ROIs and tiles.
 """
-import math
+
+def _tile_spans(min_v, max_v, tile_size, spacing, min_size, include_partials, partials_overlap):
+    """
+    Returns a list of (index, (start, stop)) for the tiles along one axis of `Rectangle.make_tile_rois`,
+    skipping tiles that are not used.
+    """
+    spans = []
+    for i in range(int(-(-(max_v - min_v) // spacing))):
+        start = min_v + i * spacing
+        stop = start + tile_size
+        if include_partials: # Crop the tile to the valid area and use it
+            stop = min(stop, max_v)
+            if stop - start < min_size:
+                continue
+        elif stop > max_v: # Only use it if the uncropped tile fits entirely
+            if not partials_overlap:
+                continue
+            (start, stop) = (max_v - tile_size, max_v)
+            if start < min_v:
+                continue
+        spans.append((i, (start, stop)))
+    return spans
 
 class Rectangle:
     """
@@ -179,7 +200,7 @@ class Rectangle:
         return overlap_area.has_area()
 
     def make_tile_rois(self, tile_shape, overlap_shape=(0, 0), include_partials=True, min_shape=(0, 0),
-                       partials_overlap=False, by_block=False):
+                       partials_overlap=False, by_block=False, block_shape=None):
         """
         Return a list of tiles encompassing the entire area of this Rectangle.
 
@@ -199,6 +220,10 @@ class Rectangle:
         by_block: bool
             If true, changes the returned generator to group tiles by block.
             This is intended to optimize disk reads by reading the entire block at once.
+        block_shape: (int, int)
+            If specified with `by_block`, rows of tiles starting in the same row of blocks
+            of this shape (i.e., the native block size of an image) are grouped together,
+            so a block on disk is not read again for each row of tiles.
 
         Returns
         -------
@@ -206,43 +231,35 @@ class Rectangle:
             Generator yielding ROIs. If `by_block` is true, returns a generator of (Rectangle, List[Rectangle])
             instead, where the first rectangle is a larger block containing multiple tiles in a list.
         """
-        tile_width, tile_height = tile_shape
-        min_width, min_height = min_shape
-
-        tile_spacing_x = tile_width  - overlap_shape[0]
-        tile_spacing_y = tile_height - overlap_shape[1]
-        num_tiles = (int(math.ceil(self.width()  / tile_spacing_x )),
-                     int(math.ceil(self.height() / tile_spacing_y)))
+        # tiles are kept or cropped independently along each axis, so find the spans once per axis
+        x_spans = _tile_spans(self.min_x, self.max_x, tile_shape[0], tile_shape[0] - overlap_shape[0],
+                              min_shape[0], include_partials, partials_overlap)
+        y_spans = _tile_spans(self.min_y, self.max_y, tile_shape[1], tile_shape[1] - overlap_shape[1],
+                              min_shape[1], include_partials, partials_overlap)
         output_tiles = []
-        for c in range(0, num_tiles[0]):
-            row_tiles = []
-            for r in range(0, num_tiles[1]):
-                tile = Rectangle(self.min_x + c*tile_spacing_x,
-                                 self.min_y + r*tile_spacing_y,
-                                 width=tile_width, height=tile_height)
-
-                if include_partials: # Crop the tile to the valid area and use it
-                    tile = tile.get_intersection(self)
-                    if tile.width() < min_width or tile.height() < min_height:
-                        continue
-                else: # Only use it if the uncropped tile fits entirely in this Rectangle
-                    if not self.contains_rect(tile):
-                        if not partials_overlap:
-                            continue
-                        tile = Rectangle(min(self.max_x, tile.max_x) - tile_width,
-                                         min(self.max_y, tile.max_y) - tile_height,
-                                         width=tile_width, height=tile_height)
-                        if not self.contains_rect(tile):
-                            continue
-                if by_block:
-                    row_tiles.append(tile)
-                else:
-                    output_tiles.append(tile)
+        block_row = None
+        for (c, (min_x, max_x)) in x_spans:
+            row_tiles = [Rectangle(min_x, min_y, max_x, max_y) for (_, (min_y, max_y)) in y_spans]
+            if not by_block:
+                output_tiles.extend(row_tiles)
 
             if by_block and row_tiles:
-                row_rect = Rectangle(row_tiles[0].min_x, row_tiles[0].min_y, row_tiles[-1].max_x, row_tiles[-1].max_y)
-                for r in row_tiles:
-                    r.shift(-row_rect.min_x, -row_rect.min_y)
-                output_tiles.append((row_rect, row_tiles))
+                row = row_tiles[0].min_x // block_shape[0] if block_shape else c
+                if output_tiles and row == block_row:
+                    output_tiles[-1].extend(row_tiles)
+                else:
+                    output_tiles.append(row_tiles)
+                block_row = row
 
+        if by_block:
+            blocks = []
+            for block_tiles in output_tiles:
+                block_rect = Rectangle(block_tiles[0].min_x, block_tiles[0].min_y,
+                                       block_tiles[0].max_x, block_tiles[0].max_y)
+                for t in block_tiles:
+                    block_rect.expand_to_contain_rect(t)
+                for t in block_tiles:
+                    t.shift(-block_rect.min_x, -block_rect.min_y)
+                blocks.append((block_rect, block_tiles))
+            return blocks
         return output_tiles
@@ -32,10 +32,11 @@ class Predictor(ABC):
     """
     Abstract class to run prediction for an image given a model.
     """
-    def __init__(self, model, tile_shape=None, show_progress=False):
+    def __init__(self, model, tile_shape=None, show_progress=False, max_tile_bytes=512 * 1024 * 1024):
         self._model = model
         self._show_progress = show_progress
         self._tile_shape = tile_shape
+        self._max_tile_bytes = max_tile_bytes
 
     @abstractmethod
     def _initialize(self, shape, image, label=None):
@@ -77,6 +78,26 @@ class Predictor(ABC):
             Pixel value for nodata (or None).
         """
 
+    def _bytes_per_pixel(self, image):
+        """
+        Returns
+        -------
+        int:
+            Estimated memory used per input pixel to predict a region of the image:
+            the image as read and as a tensor, the model inputs and the outputs. Memory
+            used inside the model is not included.
+        """
+        net_input_shape = self._model.input_shape[1:]
+        net_output_shape = self._model.output_shape[1:]
+        input_bytes = image.num_bands() * np.dtype(image.dtype()).itemsize
+        output_bytes = net_output_shape[-1] * tf.dtypes.as_dtype(self._model.dtype).size
+        if net_input_shape[0] is None and net_input_shape[1] is None:
+            return 2 * input_bytes + output_bytes
+        # chunks overlap, so each pixel is copied into input / output area chunks,
+        # and the chunk outputs are copied again when reassembled
+        copies = -(-(net_input_shape[0] * net_input_shape[1]) // (net_output_shape[0] * net_output_shape[1]))
+        return (2 + copies) * input_bytes + 2 * output_bytes
+
     def _predict_array(self, data: np.ndarray, image_nodata_value):
         """
         Runs model on data.
@@ -111,10 +132,8 @@ class Predictor(ABC):
                 y0 = (data.shape[1] - result.shape[1]) // 2
                 invalid = (data if len(data.shape) == 2 else \
                           data[:, :, 0])[x0:x0 + result.shape[0], y0:y0 + result.shape[1]] == image_nodata_value
-                if len(result.shape) == 2:
+                if invalid.any(): # most blocks have no nodata, skip the masked write
                     result[invalid] = math.nan
-                else:
-                    result[invalid, :] = math.nan
             return result
 
         out_shape = (data.shape[0] - net_input_shape[0] + net_output_shape[0],
@@ -127,22 +146,26 @@ class Predictor(ABC):
 
         best = np.zeros((chunks.shape[0],) + net_output_shape, dtype=out_type.as_numpy_dtype)
         # do 8 MB at a time... this is arbitrary, may want to change in future
-        BATCH_SIZE = max(1, int(8 * 1024 * 1024 / net_input_shape[0] / net_input_shape[1] /
-                            net_input_shape[2] / out_type.size))
+        # size the batch by the input chunks actually passed in, not the model's type
+        chunk_bytes = net_input_shape[0] * net_input_shape[1] * net_input_shape[2] * chunks.dtype.size
+        BATCH_SIZE = max(1, 8 * 1024 * 1024 // chunk_bytes)
         for i in range(0, chunks.shape[0], BATCH_SIZE):
             best[i:i+BATCH_SIZE] = self._model.predict_on_batch(chunks[i:i+BATCH_SIZE])
 
-        retval = np.zeros(out_shape + (net_output_shape[-1],))
-        for chunk_idx in range(0, best.shape[0]):
-            r = (chunk_idx // (  out_shape[1] // net_output_shape[1])) * net_output_shape[0]
-            c = (chunk_idx  % ( out_shape[1] // net_output_shape[1])) * net_output_shape[1]
-            retval[r:r+net_output_shape[0],c:c+net_output_shape[1],:] = best[chunk_idx,:,:,:]
+        # chunks are in row-major order, copy them all at once into a view of the output
+        cols = out_shape[1] // net_output_shape[1]
+        rows = best.shape[0] // cols
+        retval = np.zeros(out_shape + (net_output_shape[-1],), dtype=out_type.as_numpy_dtype)
+        out_view = retval[:rows * net_output_shape[0], :cols * net_output_shape[1], :]
+        out_view = out_view.reshape((rows, net_output_shape[0], cols, net_output_shape[1], net_output_shape[-1]))
+        out_view[:] = best.reshape((rows, cols) + net_output_shape).transpose(0, 2, 1, 3, 4)
 
         if image_nodata_value is not None:
             ox = (data.shape[0] - out_shape[0]) // 2
             oy = (data.shape[1] - out_shape[1]) // 2
-            output_slice = data[ox:-ox, oy:-oy, 0]
-            retval[output_slice == image_nodata_value] = math.nan
+            invalid = data[ox:ox + out_shape[0], oy:oy + out_shape[1], 0] == image_nodata_value
+            if invalid.any(): # most blocks have no nodata, skip the masked write
+                retval[invalid] = math.nan
 
         return retval
 
@@ -176,7 +199,12 @@ class Predictor(ABC):
             input_bounds = rectangle.Rectangle(0, 0, width=image.width(), height=image.height())
         output_shape = (input_bounds.width(), input_bounds.height())
 
-        ts = self._tile_shape if self._tile_shape else (image.width(), image.height())
+        if self._tile_shape:
+            ts = self._tile_shape
+        else:
+            num_regions = image.choose_num_regions(self._max_tile_bytes, roi=input_bounds,
+                                                   bytes_per_pixel=self._bytes_per_pixel(image))
+            ts = (-(-input_bounds.width() // num_regions), input_bounds.height())
         if net_input_shape[0] is None and net_input_shape[1] is None:
             assert net_output_shape[0] is None and net_output_shape[1] is None
             out_shape = self._model.compute_output_shape((0, ts[0], ts[1], net_input_shape[2]))
@@ -238,7 +266,8 @@ class LabelPredictor(Predictor):
     Predicts integer labels for an image.
     """
     def __init__(self, model, tile_shape=None, output_image=None, show_progress=False, # pylint:disable=too-many-arguments
-                 colormap=None, prob_image=None, error_image=None, error_colors=None):
+                 colormap=None, prob_image=None, error_image=None, error_colors=None,
+                 max_tile_bytes=512 * 1024 * 1024):
         """
         Parameters
         ----------
@@ -259,8 +288,11 @@ class LabelPredictor(Predictor):
             If given, output an image showing where the classification is incorrect.
         error_colors: List[Any]
             Colormap for the error_image.
+        max_tile_bytes: int
+            If tile_shape is not given, the image is split into strips that each need
+            about this much memory to predict.
         """
-        super().__init__(model, tile_shape, show_progress)
+        super().__init__(model, tile_shape, show_progress, max_tile_bytes)
         self._confusion_matrix = None
         self._num_classes = None
         self._output_image = output_image
@@ -373,11 +405,11 @@ class LabelPredictor(Predictor):
 
         if self._output_image is not None:
             if self._colormap is not None:
-                colormap = np.zeros((self._colormap.shape[0] + 1, self._colormap.shape[1]))
+                colormap = np.zeros((self._colormap.shape[0] + 1, self._colormap.shape[1]), dtype=np.float32)
                 colormap[0:-1, :] = self._colormap
                 if labels is not None and label_nodata is not None:
                     pred_image[pred_image == -1] = self._colormap.shape[0]
-                result = np.zeros((pred_image.shape[0], pred_image.shape[1], self._colormap.shape[1]))
+                result = np.zeros((pred_image.shape[0], pred_image.shape[1], self._colormap.shape[1]), dtype=np.float32)
                 for i in range(prob_image.shape[2]):
                     result += (colormap[i, :] * prob_image[:, :, i, np.newaxis]).astype(colormap.dtype)
                 self._output_image.write(result, x, y)
@@ -394,7 +426,8 @@ class ImagePredictor(Predictor):
     """
     Predicts an image from an image.
     """
-    def __init__(self, model, tile_shape=None, output_image=None, show_progress=False, transform=None):
+    def __init__(self, model, tile_shape=None, output_image=None, show_progress=False, # pylint:disable=too-many-arguments
+                 transform=None, max_tile_bytes=512 * 1024 * 1024):
         """
         Parameters
         ----------
@@ -410,8 +443,11 @@ class ImagePredictor(Predictor):
             The callable will be applied to the results from the network before saving
             to a file. The results should be of type output_type and the third dimension
             should be size num_bands.
+        max_tile_bytes: int
+            If tile_shape is not given, the image is split into strips that each need
+            about this much memory to predict.
         """
-        super().__init__(model, tile_shape, show_progress)
+        super().__init__(model, tile_shape, show_progress, max_tile_bytes)
         self._output_image = output_image
         self._output = None
         self._transform = transform
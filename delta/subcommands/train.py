@@ -52,8 +52,7 @@ def main(options):
         print('No images specified.', file=sys.stderr)
         return 1
 
-    img = images.load(0)
-    model = config_model(img.num_bands())
+    model = config_model(images.num_bands())
     if options.resume is not None:
         temp_model = tf.keras.models.load_model(options.resume, custom_objects=custom_objects())
     else:
@@ -27,6 +27,7 @@ import tensorflow as tf
 
 from conftest import config_reset
 
+from delta.extensions.sources import npy
 from delta.extensions.sources.tiff import TiffImage
 from delta.ml.predict import LabelPredictor, ImagePredictor
 from delta.subcommands.main import main
@@ -170,6 +171,21 @@ def test_predict_image_nodata(binary_identity_tiff_filenames):
     cm = pred.confusion_matrix()
     assert np.sum(np.diag(cm)) == np.sum(cm)
 
+def test_predict_image_nodata_same_shape():
+    # the network output is the same size as its input, so no border is trimmed
+    inputs = tf.keras.layers.Input((8, 8, 1))
+    output = tf.keras.layers.Add()([inputs, inputs])
+    model = tf.keras.Model(inputs, output)
+    data = np.ones((32, 32, 1), dtype=np.float32)
+    data[4:12, 4:12, 0] = 0
+    output_image = npy.NumpyWriter()
+    pred = ImagePredictor(model, tile_shape=(16, 16), output_image=output_image)
+    pred.predict(npy.NumpyImage(data, nodata_value=0))
+    result = output_image.buffer()
+    assert result.shape == (32, 32, 1)
+    assert np.array_equal(np.isnan(result[:, :, 0]), data[:, :, 0] == 0)
+    assert np.all(result[np.logical_not(np.isnan(result))] == 2)
+
 def test_predict_image(doubling_tiff_filenames):
     inputs = tf.keras.layers.Input((32, 32, 1))
     output = tf.keras.layers.Add()([inputs, inputs])
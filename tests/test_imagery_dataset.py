@@ -168,6 +168,13 @@ def test_rectangle_rois():
     for row in tiles:
         assert len(row) == 2
 
+    tiles = r.make_tile_rois((2, 5), include_partials=False, by_block=True, block_shape=(4, 4))
+    assert len(tiles) == 3
+    assert [len(sub) for (_, sub) in tiles] == [4, 4, 2]
+    assert tiles[0][0].bounds() == (0, 4, 0, 10)
+    assert tiles[1][0].bounds() == (4, 8, 0, 10)
+    assert tiles[1][1][3].bounds() == (2, 4, 5, 10)
+
 @pytest.fixture(scope="function")
 def autoencoder(all_sources):
     source = all_sources[0]
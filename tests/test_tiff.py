@@ -18,9 +18,11 @@
 """
 Test for GDAL I/O classes.
 """
+import concurrent.futures
 import os.path
 import pytest
 import numpy as np
+from osgeo import gdal
 
 from delta.imagery import rectangle
 from delta.extensions.sources.tiff import TiffImage, TiffWriter, write_tiff
@@ -86,6 +88,69 @@ def test_geotiff_read():
     file_path = os.path.join(os.path.dirname(__file__), 'data', 'landsat.tiff')
     check_landsat_tiff(file_path)
 
+def test_threaded_read():
+    '''
+    Tests that reading with several threads matches reading with one.
+    '''
+    file_path = os.path.join(os.path.dirname(__file__), 'data', 'landsat.tiff')
+    serial = TiffImage(file_path, num_threads=1)
+    threaded = TiffImage(file_path, num_threads=4)
+    for roi in [rectangle.Rectangle(0, 0, width=37, height=37), rectangle.Rectangle(5, 3, width=20, height=31),
+                rectangle.Rectangle(11, 0, width=1, height=37)]:
+        assert np.array_equal(serial.read(roi), threaded.read(roi))
+        assert np.array_equal(serial.read(roi, bands=[6, 2]), threaded.read(roi, bands=[6, 2]))
+
+def test_pixel_interleaved_read(tmpdir):
+    '''
+    Tests that reading several bands of a pixel interleaved file at once matches reading them one by one.
+    '''
+    data = np.random.random((5, 70, 90)).astype(np.float32)
+    filename = str(tmpdir / 'pixel.tiff')
+    handle = gdal.GetDriverByName('GTiff').Create(filename, data.shape[2], data.shape[1], data.shape[0],
+                                                  gdal.GDT_Float32, options=['INTERLEAVE=PIXEL', 'TILED=YES',
+                                                                             'BLOCKXSIZE=32', 'BLOCKYSIZE=32'])
+    for b in range(data.shape[0]):
+        handle.GetRasterBand(b + 1).WriteArray(data[b])
+    handle = None
+
+    image = TiffImage(filename, num_threads=1)
+    roi = rectangle.Rectangle(3, 10, width=50, height=71)
+    bands = [0, 1, 2, 4]
+    together = image.read(roi, bands=bands)
+    for (i, b) in enumerate(bands):
+        assert np.array_equal(together[:, :, i], image.read(roi, bands=[b])[:, :, 0])
+        assert np.array_equal(together[:, :, i], data[b, roi.min_x:roi.max_x, roi.min_y:roi.max_y])
+
+def test_multi_file_threaded_read(tmpdir):
+    '''
+    Tests reading an image made of several files from several threads at once.
+    '''
+    data = np.random.random((300, 280, 4)).astype(np.float32)
+    paths = []
+    for b in range(data.shape[2]):
+        paths.append(str(tmpdir / ('band%d.tiff' % b)))
+        write_tiff(paths[-1], data[:, :, b])
+    image = TiffImage(paths, num_threads=4)
+
+    def check(roi):
+        assert np.array_equal(image.read(roi), data[roi.min_x:roi.max_x, roi.min_y:roi.max_y, :])
+    rois = [rectangle.Rectangle(0, 0, width=300, height=280), rectangle.Rectangle(17, 40, width=200, height=101)]
+    with concurrent.futures.ThreadPoolExecutor(4) as pool:
+        list(pool.map(check, rois * 8))
+
+def test_choose_num_regions():
+    '''
+    Tests splitting an image to fit a memory budget.
+    '''
+    file_path = os.path.join(os.path.dirname(__file__), 'data', 'landsat.tiff')
+    image = TiffImage(file_path)
+    total = 37 * 37 * 8 * 4
+    assert image.choose_num_regions(total) == 1
+    assert image.choose_num_regions(total - 1) == 2
+    assert image.choose_num_regions(total // 4) == 4
+    assert image.choose_num_regions(total, bytes_per_pixel=8 * 8) == 2
+    assert image.choose_num_regions(total // 4, roi=rectangle.Rectangle(0, 0, width=10, height=37)) == 2
+
 def test_geotiff_save(tmpdir):
     '''
     Tests writing a landsat geotiff.